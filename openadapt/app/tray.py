@@ -41,13 +41,10 @@ from openadapt.custom_logger import logger
 from openadapt.db import crud
 from openadapt.models import Recording
 from openadapt.replay import replay
-from openadapt.strategies.base import BaseReplayStrategy
+from openadapt.strategies import BaseReplayStrategy, import_strategies
 from openadapt.utils import WrapStdout, get_posthog_instance
 from openadapt.visualize import main as visualize
 
-# ensure all strategies are registered
-import openadapt.strategies  # noqa: F401
-
 ICON_PATH = os.path.join(FPATH, "assets", "logo.png")
 
 
@@ -285,6 +282,7 @@ class SystemTrayIcon:
         # Strategy selection
         label = QLabel("Select Replay Strategy:")
         combo_box = QComboBox()
+        import_strategies()
         strategies = {
             cls.__name__: cls
             for cls in BaseReplayStrategy.__subclasses__()
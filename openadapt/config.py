@@ -120,6 +120,8 @@ class Config(BaseSettings):
 
     # Database
     DB_ECHO: bool = False
+    # number of rows buffered per table before being written during recording
+    DB_INSERT_BATCH_SIZE: int = 100
     DB_URL: ClassVar[str] = f"sqlite:///{DATABASE_FILE_PATH}"
 
     # Error reporting
@@ -3,14 +3,21 @@
 Module: crud.py
 """
 
-from typing import Any, TypeVar
-import asyncio
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import pairwise
+from typing import Any, ContextManager, TypeVar
+import io
 import json
+import multiprocessing
 import os
 import time
 
 from sqlalchemy.orm import Session as SaSession
-from sqlalchemy.orm import joinedload, subqueryload
+from sqlalchemy.orm import joinedload, subqueryload, undefer_group
+from sqlalchemy.orm.attributes import set_committed_value
+from PIL import Image, ImageChops
 import psutil
 import sqlalchemy as sa
 
@@ -32,16 +39,56 @@ from openadapt.models import (
 )
 from openadapt.privacy.base import ScrubbingProvider
 
-BATCH_SIZE = 1
+BATCH_SIZE = config.DB_INSERT_BATCH_SIZE
 
-lock = asyncio.Event()
-lock.set()
-action_events = []
-screenshots = []
-window_events = []
-browser_events = []
-performance_stats = []
-memory_stats = []
+# rows buffered by _insert until BATCH_SIZE is reached, keyed by table
+insert_buffers: dict[sa.Table, list[dict[str, Any]]] = defaultdict(list)
+
+# statements built once so that their compiled form is reused from the cache
+PERF_STATS_STATEMENT = (
+    sa.select(PerformanceStat)
+    .where(PerformanceStat.recording_id == sa.bindparam("recording_id"))
+    .order_by(PerformanceStat.start_time)
+)
+MEMORY_STATS_STATEMENT = (
+    sa.select(MemoryStat)
+    .where(MemoryStat.recording_id == sa.bindparam("recording_id"))
+    .order_by(MemoryStat.timestamp)
+)
+LATEST_RECORDING_STATEMENT = (
+    sa.select(Recording)
+    .options(
+        sa.orm.joinedload(Recording.screenshots),
+        sa.orm.joinedload(Recording.action_events)
+        .joinedload(ActionEvent.screenshot)
+        .joinedload(Screenshot.recording),
+        sa.orm.joinedload(Recording.action_events)
+        .joinedload(ActionEvent.screenshot)
+        .undefer_group("png"),
+        sa.orm.joinedload(Recording.window_events),
+    )
+    .order_by(sa.desc(Recording.timestamp))
+    .limit(1)
+)
+RECORDING_BY_ID_STATEMENT = sa.select(Recording).where(
+    Recording.id == sa.bindparam("recording_id")
+)
+RECORDING_BY_TIMESTAMP_STATEMENT = sa.select(Recording).where(
+    Recording.timestamp == sa.bindparam("timestamp")
+)
+
+
+@lru_cache(maxsize=None)
+def _get_column_names(table: sa.Table) -> tuple[str, ...]:
+    """Get the names of the columns of the table.
+
+    Args:
+        table (sa.Table): The SQLAlchemy table.
+
+    Returns:
+        tuple[str, ...]: The column names.
+    """
+    return tuple(column.name for column in table.__table__.columns)
 
 
 def _insert(
@@ -63,15 +110,11 @@ def _insert(
         sa.engine.Result | None: The SQLAlchemy Result object if a buffer is
           not provided. None if a buffer is provided.
     """
-    db_obj = {column.name: None for column in table.__table__.columns}
-    for key in db_obj:
-        if key in event_data:
-            val = event_data[key]
-            db_obj[key] = val
-            del event_data[key]
+    db_obj = {key: event_data.get(key) for key in _get_column_names(table)}
 
     # make sure all event data was saved
-    assert not event_data, event_data
+    extra = event_data.keys() - db_obj.keys()
+    assert not extra, extra
 
     if buffer is not None:
         buffer.append(db_obj)
@@ -86,6 +129,22 @@ def _insert(
         return result
 
 
+def flush_insert_buffers(session: SaSession) -> None:
+    """Insert all rows still buffered by _insert and commit.
+
+    Must be called before a writer exits, since rows are only written once a
+    buffer reaches BATCH_SIZE.
+
+    Args:
+        session (sa.orm.Session): The database session.
+    """
+    for table, buffer in insert_buffers.items():
+        if buffer:
+            session.execute(sa.insert(table), buffer)
+            buffer.clear()
+    session.commit()
+
+
 def insert_action_event(
     session: SaSession,
     recording: Recording,
@@ -106,7 +165,7 @@ def insert_action_event(
         "recording_id": recording.id,
         "recording_timestamp": recording.timestamp,
     }
-    _insert(session, event_data, ActionEvent, action_events)
+    _insert(session, event_data, ActionEvent, insert_buffers[ActionEvent])
 
 
 def insert_screenshot(
@@ -129,7 +188,7 @@ def insert_screenshot(
         "recording_id": recording.id,
         "recording_timestamp": recording.timestamp,
     }
-    _insert(session, event_data, Screenshot, screenshots)
+    _insert(session, event_data, Screenshot, insert_buffers[Screenshot])
 
 
 def insert_window_event(
@@ -152,7 +211,7 @@ def insert_window_event(
         "recording_id": recording.id,
         "recording_timestamp": recording.timestamp,
     }
-    _insert(session, event_data, WindowEvent, window_events)
+    _insert(session, event_data, WindowEvent, insert_buffers[WindowEvent])
 
 
 def insert_browser_event(
@@ -175,7 +234,7 @@ def insert_browser_event(
         "recording_id": recording.id,
         "recording_timestamp": recording.timestamp,
     }
-    _insert(session, event_data, BrowserEvent, browser_events)
+    _insert(session, event_data, BrowserEvent, insert_buffers[BrowserEvent])
 
 
 def insert_perf_stat(
@@ -201,7 +260,7 @@ def insert_perf_stat(
         "start_time": start_time,
         "end_time": end_time,
     }
-    _insert(session, event_perf_stat, PerformanceStat, performance_stats)
+    _insert(session, event_perf_stat, PerformanceStat, insert_buffers[PerformanceStat])
 
 
 def get_perf_stats(
@@ -218,9 +277,8 @@ def get_perf_stats(
         list[PerformanceStat]: A list of performance stats for the recording.
     """
     return (
-        session.query(PerformanceStat)
-        .filter(PerformanceStat.recording_id == recording.id)
-        .order_by(PerformanceStat.start_time)
+        session.execute(PERF_STATS_STATEMENT, {"recording_id": recording.id})
+        .scalars()
         .all()
     )
 
@@ -245,7 +303,7 @@ def insert_memory_stat(
         "memory_usage_bytes": memory_usage_bytes,
         "timestamp": timestamp,
     }
-    _insert(session, memory_stat, MemoryStat, memory_stats)
+    _insert(session, memory_stat, MemoryStat, insert_buffers[MemoryStat])
 
 
 def get_memory_stats(
@@ -263,9 +321,8 @@ def get_memory_stats(
 
     """
     return (
-        session.query(MemoryStat)
-        .filter(MemoryStat.recording_id == recording.id)
-        .order_by(MemoryStat.timestamp)
+        session.execute(MEMORY_STATS_STATEMENT, {"recording_id": recording.id})
+        .scalars()
         .all()
     )
 
@@ -338,18 +395,8 @@ def get_all_scrubbed_recordings(
 
 def get_latest_recording(session: SaSession) -> Recording:
     """Get the latest recording with preloaded relationships."""
-    return (
-        session.query(Recording)
-        .options(
-            sa.orm.joinedload(Recording.screenshots),
-            sa.orm.joinedload(Recording.action_events)
-            .joinedload(ActionEvent.screenshot)
-            .joinedload(Screenshot.recording),
-            sa.orm.joinedload(Recording.window_events),
-        )
-        .order_by(sa.desc(Recording.timestamp))
-        .first()
-    )
+    # joined eager loading of collections requires unique()
+    return session.execute(LATEST_RECORDING_STATEMENT).unique().scalars().first()
 
 
 def get_recording_by_id(session: SaSession, recording_id: int) -> Recording:
@@ -362,7 +409,11 @@ def get_recording_by_id(session: SaSession, recording_id: int) -> Recording:
     Returns:
         Recording: The latest recording object.
     """
-    return session.query(Recording).filter_by(id=recording_id).first()
+    return (
+        session.execute(RECORDING_BY_ID_STATEMENT, {"recording_id": recording_id})
+        .scalars()
+        .first()
+    )
 
 
 def get_recording(session: SaSession, timestamp: float) -> Recording:
@@ -375,12 +426,33 @@ def get_recording(session: SaSession, timestamp: float) -> Recording:
     Returns:
         Recording: The recording object.
     """
-    return session.query(Recording).filter(Recording.timestamp == timestamp).first()
+    return (
+        session.execute(RECORDING_BY_TIMESTAMP_STATEMENT, {"timestamp": timestamp})
+        .scalars()
+        .first()
+    )
 
 
 BaseModelType = TypeVar("BaseModelType")
 
 
+@lru_cache(maxsize=None)
+def _get_statement(table: BaseModelType) -> sa.Select:
+    """Get the statement selecting a recording's records, ordered by timestamp.
+
+    Args:
+        table (BaseModel): The database table to query.
+
+    Returns:
+        sa.Select: The statement, with a recording_id bound parameter.
+    """
+    return (
+        sa.select(table)
+        .where(table.recording_id == sa.bindparam("recording_id"))
+        .order_by(table.timestamp)
+    )
+
+
 def _get(
     session: SaSession,
     table: BaseModelType,
@@ -398,9 +470,8 @@ def _get(
           ordered by timestamp.
     """
     return (
-        session.query(table)
-        .filter(table.recording_id == recording_id)
-        .order_by(table.timestamp)
+        session.execute(_get_statement(table), {"recording_id": recording_id})
+        .scalars()
         .all()
     )
 
@@ -408,23 +479,26 @@ def _get(
 def get_action_events(
     session: SaSession,
     recording: Recording,
+    top_level_only: bool = False,
 ) -> list[ActionEvent]:
     """Get action events for a given recording.
 
     Args:
         session (sa.orm.Session): The database session.
         recording (Recording): The recording object.
+        top_level_only (bool): Whether to only get events without a parent.
 
     Returns:
         list[ActionEvent]: A list of action events for the recording.
     """
     assert recording, "Invalid recording."
+    query = session.query(ActionEvent).filter(ActionEvent.recording_id == recording.id)
+    if top_level_only:
+        query = query.filter(ActionEvent.parent_id.is_(None))
     action_events = (
-        session.query(ActionEvent)
-        .filter(ActionEvent.recording_id == recording.id)
-        .options(
+        query.options(
             joinedload(ActionEvent.recording),
-            joinedload(ActionEvent.screenshot),
+            joinedload(ActionEvent.screenshot).undefer_group("png"),
             joinedload(ActionEvent.browser_event),
             subqueryload(ActionEvent.window_event).joinedload(
                 WindowEvent.action_events
@@ -453,6 +527,10 @@ def filter_disabled_action_events(
     return [event for event in action_events if not event.disabled]
 
 
+# never equal to a key, for stop sequences that can no longer match
+NO_STOP_KEY = object()
+
+
 def filter_stop_sequences(action_events: list[ActionEvent]) -> None:
     """Filter stop sequences.
 
@@ -475,40 +553,52 @@ def filter_stop_sequences(action_events: list[ActionEvent]) -> None:
             action_events.pop()
             return
 
+    stop_sequences = config.STOP_SEQUENCES
+    # keys of each sequence, for constant time membership tests of release events
+    stop_sequence_keys = [frozenset(sequence) for sequence in stop_sequences]
+
     # create list of indices for sequence detection
     # one index for each stop sequence in STOP_SEQUENCES
     # start from the back of the sequence
-    stop_sequence_indices = [len(sequence) - 1 for sequence in config.STOP_SEQUENCES]
+    stop_sequence_indices = [len(sequence) - 1 for sequence in stop_sequences]
 
     # index of sequence to remove, -1 if none found
     sequence_to_remove = -1
     # number of events to remove
     num_to_remove = 0
 
-    for i in range(0, len(config.STOP_SEQUENCES)):
+    for i, stop_sequence in enumerate(stop_sequences):
+        # per-sequence state, only updated when a press event matches
+        stop_keys = stop_sequence_keys[i]
+        stop_idx = stop_sequence_indices[i]
+        stop_key = stop_sequence[stop_idx]
         # iterate backwards through list of action events
-        for j in range(len(action_events) - 1, -1, -1):
-            # never go past 1st action event, so if a sequence is longer than
-            # len(action_events), it can't have been in the recording
-            if (
-                action_events[j].canonical_key_char
-                == config.STOP_SEQUENCES[i][stop_sequence_indices[i]]
-                or action_events[j].canonical_key_name
-                == config.STOP_SEQUENCES[i][stop_sequence_indices[i]]
-            ) and action_events[j].name == "press":
+        # never go past 1st action event, so if a sequence is longer than
+        # len(action_events), it can't have been in the recording
+        for action_event in reversed(action_events):
+            # read each column attribute once per event
+            name = action_event.name
+            key_char = action_event.canonical_key_char
+            key_name = action_event.canonical_key_name
+            if name == "press" and (key_char == stop_key or key_name == stop_key):
                 # for press events, compare the characters
-                stop_sequence_indices[i] -= 1
+                stop_idx -= 1
+                # a repeated sequence can match past its first key, where the
+                # index would be out of range
+                stop_key = (
+                    stop_sequence[stop_idx]
+                    if stop_idx >= -len(stop_sequence)
+                    else NO_STOP_KEY
+                )
                 num_to_remove += 1
-            elif action_events[j].name == "release" and (
-                action_events[j].canonical_key_char in config.STOP_SEQUENCES[i]
-                or action_events[j].canonical_key_name in config.STOP_SEQUENCES[i]
-            ):
+            elif name == "release" and (key_char in stop_keys or key_name in stop_keys):
                 # can consider any release event with any sequence char as
                 # part of the sequence
                 num_to_remove += 1
             else:
                 # not part of the sequence, so exit inner loop
                 break
+        stop_sequence_indices[i] = stop_idx
 
         if stop_sequence_indices[i] == -1:
             # completed whole sequence, so set sequence_to_remove to
@@ -518,40 +608,128 @@ def filter_stop_sequences(action_events: list[ActionEvent]) -> None:
 
     if sequence_to_remove != -1:
         # remove that sequence
-        for _ in range(0, num_to_remove):
-            action_events.pop()
+        del action_events[-num_to_remove:]
+
+
+def compute_png_diff(prev_png_data: bytes, png_data: bytes) -> tuple[bytes, bytes]:
+    """Compute the PNG encoded diff and diff mask between two PNG images.
+
+    Operates on raw bytes only so that it can run in a worker process.
+
+    Args:
+        prev_png_data (bytes): The PNG data of the previous screenshot.
+        png_data (bytes): The PNG data of the current screenshot.
+
+    Returns:
+        tuple[bytes, bytes]: The PNG data of the diff and of the diff mask.
+    """
+    prev_image = Image.open(io.BytesIO(prev_png_data))
+    image = Image.open(io.BytesIO(png_data))
+    diff = ImageChops.difference(image, prev_image)
+    diff_mask = diff.convert("1")
+
+    def encode(image: Image.Image) -> bytes:
+        """Encode the image as PNG data."""
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    return encode(diff), encode(diff_mask)
 
 
 def save_screenshot_diff(
-    session: SaSession, screenshots: list[Screenshot]
+    session: SaSession,
+    screenshots: list[Screenshot],
+    batch_size: int = 100,
+    num_workers: int | None = None,
+    chunk_size: int = 50,
 ) -> list[Screenshot]:
     """Save screenshot diff data to the database.
 
+    Only screenshots missing diff data are written, batch_size rows at a time.
+    Diffs of screenshots stored as PNG data are computed across num_workers
+    processes, chunk_size screenshots per task. They are computed serially when
+    there are too few to be worth starting the processes for, or when called from
+    a daemonic process.
+
     Args:
         session (sa.orm.Session): The database session.
         screenshots (list[Screenshot]): A list of screenshots.
+        batch_size (int): The number of rows to write per UPDATE batch.
+        num_workers (int, optional): The number of processes used to compute
+            diffs. Defaults to the number of CPUs.
+        chunk_size (int): The number of screenshots sent to a process at a time.
 
     Returns:
         list[Screenshot]: A list of screenshots with diff data saved to the db.
     """
-    data_updated = False
     logger.info("verifying diffs for screenshots...")
 
+    pooled = []
+    diff_datas = []
     for screenshot in screenshots:
         if not screenshot.prev:
             continue
+        if screenshot.png_diff_data and screenshot.png_diff_mask_data:
+            continue
+        if (
+            screenshot.png_data
+            and screenshot.prev.png_data
+            and not (screenshot.png_diff_data or screenshot.png_diff_mask_data)
+        ):
+            pooled.append(screenshot)
+            continue
+        # the diff is computed once and reused by the mask
+        diff_data = {}
         if not screenshot.png_diff_data:
-            screenshot.png_diff_data = screenshot.convert_png_to_binary(screenshot.diff)
-            data_updated = True
+            diff_data["png_diff_data"] = screenshot.convert_png_to_binary(
+                screenshot.diff
+            )
         if not screenshot.png_diff_mask_data:
-            screenshot.png_diff_mask_data = screenshot.convert_png_to_binary(
+            diff_data["png_diff_mask_data"] = screenshot.convert_png_to_binary(
                 screenshot.diff_mask
             )
-            data_updated = True
+        diff_datas.append((screenshot, diff_data))
 
-    if data_updated:
-        logger.info("saving screenshot diff data to db...")
-        session.bulk_save_objects(screenshots)
+    if pooled:
+        args = (
+            [screenshot.prev.png_data for screenshot in pooled],
+            [screenshot.png_data for screenshot in pooled],
+        )
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        # starting the pool costs more than diffing a few chunks of screenshots,
+        # and daemonic processes (e.g. replay) are not allowed to have children
+        if (
+            num_workers > 1
+            and len(pooled) > 2 * chunk_size
+            and not multiprocessing.current_process().daemon
+        ):
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                results = list(
+                    executor.map(compute_png_diff, *args, chunksize=chunk_size)
+                )
+        else:
+            results = list(map(compute_png_diff, *args))
+        for screenshot, (png_diff_data, png_diff_mask_data) in zip(pooled, results):
+            diff_data = {
+                "png_diff_data": png_diff_data,
+                "png_diff_mask_data": png_diff_mask_data,
+            }
+            diff_datas.append((screenshot, diff_data))
+
+    for screenshot, diff_data in diff_datas:
+        for key, value in diff_data.items():
+            # written below, so don't mark the instance as dirty
+            set_committed_value(screenshot, key, value)
+
+    mappings = [
+        {"id": screenshot.id, **diff_data} for screenshot, diff_data in diff_datas
+    ]
+    for i in range(0, len(mappings), batch_size):
+        session.bulk_update_mappings(Screenshot, mappings[i : i + batch_size])
+    if mappings:
+        logger.info(f"saving diff data for {len(mappings)} screenshots to db...")
         session.commit()
 
     return screenshots
@@ -578,12 +756,13 @@ def get_screenshots(
             subqueryload(Screenshot.action_event).subqueryload(ActionEvent.recording),
             subqueryload(Screenshot.action_event).subqueryload(ActionEvent.screenshot),
             subqueryload(Screenshot.recording),
+            undefer_group("png"),
         )
         .order_by(Screenshot.timestamp)
         .all()
     )
 
-    for prev, cur in zip(screenshots, screenshots[1:]):
+    for prev, cur in pairwise(screenshots):
         cur.prev = prev
     if screenshots:
         screenshots[0].prev = screenshots[0]
@@ -694,6 +873,20 @@ def get_new_session(
     return Session()
 
 
+def transactional_session() -> ContextManager[SaSession]:
+    """Get a read-and-write session that commits once when its block exits.
+
+    All changes made within the block form a single transaction, which is rolled
+    back if an exception is raised. The session is closed on exit. Functions that
+    leave committing to their caller, e.g. post_process_events, are meant to be
+    called within this block.
+
+    Returns:
+        ContextManager[sa.orm.Session]: A context manager yielding the session.
+    """
+    return Session.begin()
+
+
 def update_video_start_time(
     session: SaSession, recording: Recording, video_start_time: float
 ) -> None:
@@ -777,39 +970,91 @@ def get_audio_info(
     return audio_infos[0] if audio_infos else None
 
 
+def _timestamp_to_id(
+    table: BaseModelType,
+    timestamp_column: sa.Column,
+    recording_id: int,
+) -> sa.ScalarSelect:
+    """Select the id of the row in table whose timestamp matches timestamp_column.
+
+    Args:
+        table (BaseModel): The table to look up ids in.
+        timestamp_column (sa.Column): The correlated column holding the timestamp.
+        recording_id (int): The recording id.
+
+    Returns:
+        sa.ScalarSelect: A correlated scalar subquery (NULL if there is no match).
+    """
+    return (
+        sa.select(table.id)
+        .where(
+            table.recording_id == recording_id,
+            table.timestamp == timestamp_column,
+        )
+        # if timestamps are duplicated, prefer the last row inserted
+        .order_by(table.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
 def post_process_events(session: SaSession, recording: Recording) -> None:
     """Post-process events.
 
+    Links each action event to its screenshot, window event, and browser event
+    by timestamp in a single UPDATE, without loading any rows.
+
+    The caller owns the transaction: changes are neither committed nor rolled
+    back here, so call this within transactional_session, or commit the session
+    afterwards.
+
     Args:
         session (sa.orm.Session): The database session.
         recording (Recording): The recording to post-process.
     """
-    screenshots = _get(session, Screenshot, recording.id)
-    action_events = _get(session, ActionEvent, recording.id)
-    window_events = _get(session, WindowEvent, recording.id)
-    browser_events = _get(session, BrowserEvent, recording.id)
+    session.execute(
+        sa.update(ActionEvent)
+        .where(ActionEvent.recording_id == recording.id)
+        .values(
+            screenshot_id=_timestamp_to_id(
+                Screenshot, ActionEvent.screenshot_timestamp, recording.id
+            ),
+            window_event_id=_timestamp_to_id(
+                WindowEvent, ActionEvent.window_event_timestamp, recording.id
+            ),
+            browser_event_id=_timestamp_to_id(
+                BrowserEvent, ActionEvent.browser_event_timestamp, recording.id
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
 
-    screenshot_timestamp_to_id_map = {
-        screenshot.timestamp: screenshot.id for screenshot in screenshots
-    }
-    window_event_timestamp_to_id_map = {
-        window_event.timestamp: window_event.id for window_event in window_events
-    }
-    browser_event_timestamp_to_id_map = {
-        browser_event.timestamp: browser_event.id for browser_event in browser_events
-    }
 
-    for action_event in action_events:
-        action_event.screenshot_id = screenshot_timestamp_to_id_map.get(
-            action_event.screenshot_timestamp
-        )
-        action_event.window_event_id = window_event_timestamp_to_id_map.get(
-            action_event.window_event_timestamp
-        )
-        action_event.browser_event_id = browser_event_timestamp_to_id_map.get(
-            action_event.browser_event_timestamp
+def _preload_action_event_children(
+    session: SaSession, recording: Recording
+) -> list[ActionEvent]:
+    """Load all action events of a recording with their descendants.
+
+    Loading every level of children in a few queries up front avoids one lazy load
+    per event while copying. Action events loaded later in the same session, e.g.
+    by get_events, reuse these instances for as long as they are referenced.
+
+    Args:
+        session (sa.orm.Session): The database session.
+        recording (Recording): The recording object.
+
+    Returns:
+        list[ActionEvent]: The action events, with children loaded.
+    """
+    return (
+        session.execute(
+            sa.select(ActionEvent)
+            .where(ActionEvent.recording_id == recording.id)
+            .options(sa.orm.selectinload(ActionEvent.children, recursion_depth=-1))
         )
-    session.commit()
+        .scalars()
+        .all()
+    )
 
 
 def copy_recording(session: SaSession, recording_id: int) -> int:
@@ -828,47 +1073,62 @@ def copy_recording(session: SaSession, recording_id: int) -> int:
         recording = session.query(Recording).get(recording_id)
         new_recording = copy_sa_instance(recording, original_recording_id=recording.id)
         session.add(new_recording)
-        session.commit()
-        session.refresh(new_recording)
+        # assign the new id without committing, so the whole copy is one transaction
+        session.flush()
 
         def copy_action_event(
             action_event: ActionEvent, recording_id: int
         ) -> ActionEvent:
             new_action_event = copy_sa_instance(action_event, recording_id=recording_id)
-            for child in action_event.children:
-                new_child = copy_action_event(child, recording_id=recording_id)
-                new_action_event.children.append(new_child)
+            # copy descendants iteratively, preserving the order of children
+            to_copy = [(action_event, new_action_event)]
+            while to_copy:
+                original, copy = to_copy.pop()
+                for child in original.children:
+                    new_child = copy_sa_instance(child, recording_id=recording_id)
+                    copy.children.append(new_child)
+                    to_copy.append((child, new_child))
             return new_action_event
 
         read_only_session = get_new_session(read_only=True)
+        # the session only holds weak references, so the preloaded events must stay
+        # referenced until they have been copied
+        preloaded_action_events = _preload_action_event_children(
+            read_only_session, recording
+        )
         action_events = get_events(read_only_session, recording)
         new_action_events = [
             copy_action_event(action_event, recording_id=new_recording.id)
             for action_event in action_events
         ]
-
-        screenshots = [action_event.screenshot for action_event in action_events]
-        window_events = [action_event.window_event for action_event in action_events]
-        browser_events = [action_event.browser_event for action_event in action_events]
-
-        for i, action_event in enumerate(new_action_events):
-            action_event.screenshot = copy_sa_instance(
-                screenshots[i], recording_id=new_recording.id
-            )
-            action_event.window_event = copy_sa_instance(
-                window_events[i], recording_id=new_recording.id
-            )
-            action_event.browser_event = copy_sa_instance(
-                browser_events[i], recording_id=new_recording.id
-            )
-
-            session.add(action_event)
-
+        del preloaded_action_events
+
+        # many action events share a screenshot, window event, or browser event, so
+        # copy each of those once and share the copy, as in the original recording
+        copies_by_id = {}
+
+        def copy_shared(instance: Any) -> Any:
+            if instance is None:
+                return None
+            key = id(instance)
+            if key not in copies_by_id:
+                copies_by_id[key] = copy_sa_instance(
+                    instance, recording_id=new_recording.id
+                )
+            return copies_by_id[key]
+
+        for action_event, new_action_event in zip(action_events, new_action_events):
+            new_action_event.screenshot = copy_shared(action_event.screenshot)
+            new_action_event.window_event = copy_shared(action_event.window_event)
+            new_action_event.browser_event = copy_shared(action_event.browser_event)
+
+        session.add_all(new_action_events)
         session.commit()
 
         return new_recording.id
     except Exception as e:
         logger.error(f"Error copying recording: {e}")
+        session.rollback()
         return None
 
 
@@ -882,10 +1142,9 @@ def scrub_item(item_id: int, table: sa.Table, scrubber: ScrubbingProvider) -> No
         table (sa.Table): The table to scrub the item from.
         scrubber (ScrubbingProvider): The scrubbing provider to use.
     """
-    with get_new_session(read_and_write=True) as session:
+    with transactional_session() as session:
         item = session.query(table).get(item_id)
         item.scrub(scrubber)
-        session.commit()
 
 
 def insert_scrubbed_recording(
@@ -901,15 +1160,17 @@ def insert_scrubbed_recording(
     Returns:
         int: The id of the scrubbed recording.
     """
-    scrubbed_recording = ScrubbedRecording(
-        recording_id=recording_id,
-        provider=provider,
-        timestamp=utils.set_start_time(),
-    )
-    session.add(scrubbed_recording)
+    # only the id is needed, so return it from the INSERT instead of refreshing
+    scrubbed_recording_id = session.execute(
+        sa.insert(ScrubbedRecording)
+        .values(
+            recording_id=recording_id,
+            provider=provider,
+            timestamp=utils.set_start_time(),
+        )
+        .returning(ScrubbedRecording.id)
+    ).scalar_one()
     session.commit()
-    session.refresh(scrubbed_recording)
-    scrubbed_recording_id = scrubbed_recording.id
     return scrubbed_recording_id
 
 
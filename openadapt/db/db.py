@@ -26,6 +26,18 @@ NAMING_CONVENTION = {
     "pk": "pk_%(table_name)s",
 }
 
+SQLITE_PRAGMAS = (
+    # readers don't block the writer and vice versa, and commits only append to
+    # the log, which is synced at checkpoints rather than on every commit
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "wal_autocheckpoint=10000",
+    "temp_store=MEMORY",
+    # 256 MiB of memory mapped I/O and a 64 MiB page cache
+    "mmap_size=268435456",
+    "cache_size=-65536",
+)
+
 
 class BaseModel(DictableModel):
     """The base model for database tables."""
@@ -51,9 +63,28 @@ def get_engine() -> sa.engine:
     """Create and return a database engine."""
     engine = sa.create_engine(
         config.DB_URL,
-        connect_args={"check_same_thread": False},
+        # wait for locks held by other writers instead of failing immediately
+        connect_args={"check_same_thread": False, "timeout": 30},
         echo=config.DB_ECHO,
+        # scrubbing runs up to 15 worker threads alongside the UI and recorder,
+        # each with its own session, which would exhaust the default pool of 5 + 10
+        pool_size=8,
+        max_overflow=16,
     )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+        """Configure each new SQLite connection with SQLITE_PRAGMAS.
+
+        Args:
+            dbapi_connection (Any): The DBAPI connection.
+            connection_record (Any): The connection pool record.
+        """
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+
     return engine
 
 
@@ -4,7 +4,6 @@ from pprint import pformat
 from typing import Any, Callable, Optional
 import time
 
-from scipy.spatial import distance
 import numpy as np
 
 from openadapt import browser, common, models, utils
@@ -43,7 +42,11 @@ def get_events(
         event="get_events.started", properties={"recording_id": recording.id}
     )
     start_time = time.time()
-    action_events = crud.get_action_events(db, recording)
+    # if recording is a copy, it already has its events processed when it
+    # was created, so only the top level events are needed
+    action_events = crud.get_action_events(
+        db, recording, top_level_only=bool(recording.original_recording_id)
+    )
     window_events = crud.get_window_events(db, recording)
     browser_events = crud.get_browser_events(db, recording)
     screenshots = crud.get_screenshots(db, recording)
@@ -52,15 +55,16 @@ def get_events(
     browser.log_stats(browser_stats)
 
     if recording.original_recording_id:
-        # if recording is a copy, it already has its events processed when it
-        # was created, return only the top level events
         posthog.capture(
             event="get_events.completed", properties={"recording_id": recording.id}
         )
-        return [event for event in action_events if event.parent_id is None]
+        return action_events
 
-    raw_action_event_dicts = utils.rows2dicts(action_events)
-    logger.debug(f"raw_action_event_dicts=\n{pformat(raw_action_event_dicts)}")
+    # only format the events if the message will be logged
+    logger.opt(lazy=True).debug(
+        "raw_action_event_dicts=\n{}",
+        lambda: pformat(utils.rows2dicts(action_events)),
+    )
 
     num_action_events = len(action_events)
     assert num_action_events > 0, "No action events found."
@@ -249,15 +253,14 @@ def merge_consecutive_mouse_move_events(
                     diff_positions = np.argwhere(diff_mask)
                     _ts.append(time.perf_counter())
 
-                    # ~6x slowdown
-                    distances = distance.cdist(
-                        [cursor_position],
-                        diff_positions,
+                    # compare squared distances and take a single square root,
+                    # rather than one per diff position (as with cdist)
+                    sq_distances = np.square(diff_positions - cursor_position).sum(
+                        axis=1
                     )
                     _ts.append(time.perf_counter())
 
-                    # ~1x slowdown
-                    min_distance = distances.min()
+                    min_distance = np.sqrt(sq_distances.min())
                     _ts.append(time.perf_counter())
                     _dts = np.diff(_ts)
                     _all_dts.append(_dts)
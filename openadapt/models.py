@@ -2,6 +2,7 @@
 
 from collections import OrderedDict
 from copy import deepcopy
+from functools import lru_cache
 from itertools import zip_longest
 from typing import Any, Type, Union
 import copy
@@ -130,6 +131,15 @@ class ActionEvent(db.Base):
     """Class representing an action event in the database."""
 
     __tablename__ = "action_event"
+    __table_args__ = (
+        # partial index for selecting only the top level events of a recording
+        sa.Index(
+            "ix_action_event_recording_id_timestamp_top_level",
+            "recording_id",
+            "timestamp",
+            sqlite_where=sa.text("parent_id IS NULL"),
+        ),
+    )
     _repr_ignore_attrs = ["reducer_names"]
 
     _segment_description_separator = ";"
@@ -489,13 +499,16 @@ class ActionEvent(db.Base):
 
     def scrub(self, scrubber: ScrubbingProvider) -> None:
         """Scrub the action event."""
-        self.scrubbed_text = scrubber.scrub_text(self.text, is_separated=True)
-        self.scrubbed_canonical_text = scrubber.scrub_text(
-            self.canonical_text, is_separated=True
-        )
-        self.key_char = scrubber.scrub_text(self.key_char)
-        self.canonical_key_char = scrubber.scrub_text(self.canonical_key_char)
-        self.key_vk = scrubber.scrub_text(self.key_vk)
+        # batch texts so that providers can scrub them in as few requests as possible
+        (
+            self.scrubbed_text,
+            self.scrubbed_canonical_text,
+        ) = scrubber.scrub_texts([self.text, self.canonical_text], is_separated=True)
+        (
+            self.key_char,
+            self.canonical_key_char,
+            self.key_vk,
+        ) = scrubber.scrub_texts([self.key_char, self.canonical_key_char, self.key_vk])
 
     def to_prompt_dict(self) -> dict[str, Any]:
         """Convert into a dict, excluding properties not necessary for prompting.
@@ -630,6 +643,9 @@ class WindowEvent(db.Base):
     """Class representing a window event in the database."""
 
     __tablename__ = "window_event"
+    __table_args__ = (
+        sa.Index("ix_window_event_recording_id_timestamp", "recording_id", "timestamp"),
+    )
 
     id = sa.Column(sa.Integer, primary_key=True)
     recording_timestamp = sa.Column(ForceFloat)
@@ -756,6 +772,11 @@ class BrowserEvent(db.Base):
     """Class representing a browser event in the database."""
 
     __tablename__ = "browser_event"
+    __table_args__ = (
+        sa.Index(
+            "ix_browser_event_recording_id_timestamp", "recording_id", "timestamp"
+        ),
+    )
 
     id = sa.Column(sa.Integer, primary_key=True)
     recording_timestamp = sa.Column(ForceFloat)
@@ -925,14 +946,23 @@ class Screenshot(db.Base):
     """Class representing a screenshot in the database."""
 
     __tablename__ = "screenshot"
+    __table_args__ = (
+        sa.Index("ix_screenshot_recording_id_timestamp", "recording_id", "timestamp"),
+    )
 
     id = sa.Column(sa.Integer, primary_key=True)
     recording_timestamp = sa.Column(ForceFloat)
     recording_id = sa.Column(sa.ForeignKey("recording.id"))
     timestamp = sa.Column(ForceFloat)
-    png_data = sa.Column(sa.LargeBinary)
-    png_diff_data = sa.Column(sa.LargeBinary, nullable=True)
-    png_diff_mask_data = sa.Column(sa.LargeBinary, nullable=True)
+    # image data is only loaded when accessed (or when its group is undeferred),
+    # so that screenshot metadata can be loaded without it
+    png_data = sa.orm.deferred(sa.Column(sa.LargeBinary), group="png")
+    png_diff_data = sa.orm.deferred(
+        sa.Column(sa.LargeBinary, nullable=True), group="png"
+    )
+    png_diff_mask_data = sa.orm.deferred(
+        sa.Column(sa.LargeBinary, nullable=True), group="png"
+    )
     # cropped_png_data = sa.Column(sa.LargeBinary, nullable=True)
 
     recording = sa.orm.relationship("Recording", back_populates="screenshots")
@@ -1033,8 +1063,9 @@ class Screenshot(db.Base):
         if self.png_diff_data:
             return self.convert_binary_to_png(self.png_diff_data)
 
-        assert self.prev, "Attempted to compute diff before setting prev"
-        self._diff = ImageChops.difference(self.image, self.prev.image)
+        if self._diff is None:
+            assert self.prev, "Attempted to compute diff before setting prev"
+            self._diff = ImageChops.difference(self.image, self.prev.image)
         return self._diff
 
     @property
@@ -1043,7 +1074,7 @@ class Screenshot(db.Base):
         if self.png_diff_mask_data:
             return self.convert_binary_to_png(self.png_diff_mask_data)
 
-        if self.diff:
+        if self._diff_mask is None:
             self._diff_mask = self.diff.convert("1")
         return self._diff_mask
 
@@ -1187,6 +1218,23 @@ class Replay(db.Base):
     git_hash = sa.Column(sa.String)
 
 
+@lru_cache(maxsize=None)
+def _get_copied_column_names(cls: Type[db.Base]) -> tuple[str, ...]:
+    """Get the names of the columns copied by copy_sa_instance.
+
+    Args:
+        cls (Type[Base]): The SQLAlchemy model class.
+
+    Returns:
+        tuple[str, ...]: The names of all columns except primary and foreign keys.
+    """
+    table = cls.__table__
+    pk_columns = [k for k in table.primary_key.columns.keys()]
+    fk_columns = [k.parent.name for k in table.foreign_keys]
+    exclude_columns = pk_columns + fk_columns
+    return tuple(c for c in table.columns.keys() if c not in exclude_columns)
+
+
 def copy_sa_instance(sa_instance: db.Base, **kwargs: dict) -> db.Base:
     """Copy a SQLAlchemy instance.
 
@@ -1199,14 +1247,9 @@ def copy_sa_instance(sa_instance: db.Base, **kwargs: dict) -> db.Base:
     """
     sa_instance.id
 
-    table = sa_instance.__table__
-    pk_columns = [k for k in table.primary_key.columns.keys()]
-    fk_columns = [k.parent.name for k in table.foreign_keys]
-    exclude_columns = pk_columns + fk_columns
     data = {
         c: getattr(sa_instance, c)
-        for c in table.columns.keys()
-        if c not in exclude_columns
+        for c in _get_copied_column_names(sa_instance.__class__)
     }
     data.update(kwargs)
     clone = sa_instance.__class__(**data)
@@ -1,14 +1,14 @@
 """Plotting utilities."""
 
 from collections import defaultdict
-from io import BytesIO
+from functools import lru_cache
 from itertools import cycle
 import math
 import os
 import sys
 import unicodedata
 
-from PIL import Image, ImageDraw, ImageEnhance, ImageFont
+from PIL import Image, ImageDraw, ImageFont
 import matplotlib.pyplot as plt
 import numpy as np
 
@@ -67,9 +67,13 @@ def draw_ellipse(
     return image, width, height
 
 
+@lru_cache(maxsize=64)
 def get_font(original_font_name: str, font_size: int) -> ImageFont.FreeTypeFont:
     """Get a font object.
 
+    Fonts are cached by name and size, since loading a font face from disk is
+    expensive and the same few fonts are requested for every displayed event.
+
     Args:
         original_font_name (str): The original font name.
         font_size (int): The font size.
@@ -262,8 +266,10 @@ def display_event(
             f"{screenshot=} for {action_event=} {window_event=} {recording=}"
         )
         return None
-    if diff and screenshot.diff:
-        image = screenshot.diff.convert("RGBA")
+    # stored diffs are decoded on every access, so only access it once
+    diff_image = screenshot.diff if diff else None
+    if diff and diff_image:
+        image = diff_image.convert("RGBA")
     else:
         image = screenshot.image.convert("RGBA")
     width_ratio, height_ratio = utils.get_scale_ratios(action_event)
@@ -281,7 +287,7 @@ def display_event(
 
     # display diff bbox
     if diff:
-        diff_bbox = screenshot.diff.getbbox()
+        diff_bbox = diff_image.getbbox()
         if diff_bbox:
             x0, y0, x1, y1 = diff_bbox
             image = draw_rectangle(
@@ -486,7 +492,8 @@ def plot_performance(
             else:
                 os.system(f"xdg-open {fpath}")
     else:
-        plt.savefig(BytesIO(), format="png")  # save fig to void
+        # render the canvas without also encoding it to a discarded PNG
+        fig.canvas.draw()
         if view_file:
             plt.show()
         else:
@@ -738,8 +745,15 @@ def highlight_masks(
     # Convert combined mask back to PIL Image for blending
     combined_mask = Image.fromarray(combined_mask_np)
 
-    # Prepare the darkened image
-    darkened_image = ImageEnhance.Brightness(original).enhance(1 - darken_factor)
+    # Prepare the darkened image in a single pass (equivalent to
+    # ImageEnhance.Brightness, without allocating and blending a black image)
+    original_arr = np.asarray(original)
+    darkened_arr = (original_arr * (1 - darken_factor)).astype(np.uint8)
+    bands = original.getbands()
+    if "A" in bands:
+        alpha_idx = bands.index("A")
+        darkened_arr[..., alpha_idx] = original_arr[..., alpha_idx]
+    darkened_image = Image.fromarray(darkened_arr)
 
     # Apply the combined mask:
     # where the mask is, keep original; where it's not, use darkened
@@ -778,10 +792,7 @@ def plot_segments(
     draw = ImageDraw.Draw(image)
     img_width, img_height = image.size
 
-    try:
-        font = ImageFont.truetype("arial.ttf", 16)
-    except IOError:
-        font = ImageFont.load_default()
+    font = get_font("arial.ttf", 16)
 
     for segment in segments:
         name = normalize_text(segment["name"])
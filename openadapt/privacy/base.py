@@ -40,6 +40,24 @@ class ScrubbingProvider(BaseModel):
         """
         raise NotImplementedError
 
+    def scrub_texts(
+        self, texts: list[str | None], is_separated: bool = False
+    ) -> list[str | None]:
+        """Scrub each of the texts of all PII/PHI.
+
+        Providers that can process several texts per request should override this.
+
+        Args:
+            texts (list[str | None]): Texts to be scrubbed. None and empty texts
+                are returned as is.
+            is_separated (bool): Whether the texts are separated with special
+                characters
+
+        Returns:
+            list[str | None]: Scrubbed texts, in the same order
+        """
+        return [self.scrub_text(text, is_separated) if text else text for text in texts]
+
     def scrub_image(
         self,
         image: Image,
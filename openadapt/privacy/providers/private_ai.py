@@ -5,6 +5,8 @@ from typing import List
 import base64
 
 from PIL import Image
+from requests.adapters import HTTPAdapter
+import orjson
 import requests
 
 from openadapt.config import config
@@ -19,6 +21,24 @@ IMAGE_CONTENT_TYPE = "image/png"
 PDF_CONTENT_TYPE = "application/pdf"
 TEMP_IMAGEFILE_NAME = "temp_image_to_scrub.png"
 TEXT_URL = "https://api.private-ai.com/deid/v3/process/text"
+TEXT_ENTITY_DETECTION = {
+    "accuracy": "high",
+    "return_entity": True,
+}
+TEXT_PROCESSED_TEXT = {
+    "type": "MARKER",
+    "pattern": "[UNIQUE_NUMBERED_ENTITY_TYPE]",
+}
+# scrubbing runs up to 15 worker threads, all sharing this pool
+HTTP_POOL_MAXSIZE = 16
+
+# reuse connections (and TLS sessions) across requests instead of reconnecting
+# for every string or image scrubbed
+http_session = requests.Session()
+http_session.mount(
+    "https://",
+    HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE),
+)
 
 
 class PrivateAIScrubbingProvider(
@@ -39,17 +59,32 @@ class PrivateAIScrubbingProvider(
         Returns:
             str: redacted text
         """
+        return self.scrub_texts([text], is_separated)[0]
+
+    def scrub_texts(
+        self, texts: list[str | None], is_separated: bool = False
+    ) -> list[str | None]:
+        """Scrub the texts of all PII/PHI in a single request.
+
+        Args:
+            texts (list[str | None]): Texts to be redacted. None and empty texts
+                are returned as is, without being sent.
+            is_separated (bool): Whether the texts are separated with special
+                characters
+
+        Returns:
+            list[str | None]: redacted texts, in the same order
+        """
+        redacted_texts = list(texts)
+        indices = [i for i, text in enumerate(texts) if text]
+        if not indices:
+            return redacted_texts
+
         payload = {
-            "text": [text],
+            "text": [texts[i] for i in indices],
             "link_batch": False,
-            "entity_detection": {
-                "accuracy": "high",
-                "return_entity": True,
-            },
-            "processed_text": {
-                "type": "MARKER",
-                "pattern": "[UNIQUE_NUMBERED_ENTITY_TYPE]",
-            },
+            "entity_detection": TEXT_ENTITY_DETECTION,
+            "processed_text": TEXT_PROCESSED_TEXT,
         }
 
         headers = {
@@ -57,7 +92,9 @@ class PrivateAIScrubbingProvider(
             "X-API-KEY": config.PRIVATE_AI_API_KEY,
         }
 
-        response = requests.post(TEXT_URL, json=payload, headers=headers)
+        response = http_session.post(
+            TEXT_URL, data=orjson.dumps(payload), headers=headers
+        )
         response.raise_for_status()
         data = response.json()
         logger.debug(f"{data=}")
@@ -70,10 +107,16 @@ class PrivateAIScrubbingProvider(
         if type(data) is dict and "detail" in data:
             raise ValueError(data.get("detail"))
 
-        redacted_text = data[0].get("processed_text")
-        logger.debug(f"{redacted_text=}")
+        # a text without a result must not be returned unscrubbed
+        if len(data) != len(indices):
+            raise ValueError(
+                f"Expected {len(indices)} processed texts, got {len(data)}"
+            )
+        for i, item in zip(indices, data):
+            redacted_texts[i] = item["processed_text"]
+        logger.debug(f"{redacted_texts=}")
 
-        return redacted_text
+        return redacted_texts
 
     def scrub_image(
         self,
@@ -113,7 +156,9 @@ class PrivateAIScrubbingProvider(
             "X-API-KEY": config.PRIVATE_AI_API_KEY,
         }
 
-        response = requests.post(BASE64_URL, json=payload, headers=headers)
+        response = http_session.post(
+            BASE64_URL, data=orjson.dumps(payload), headers=headers
+        )
         response = response.json()
         logger.debug(f"{response=}")
 
@@ -166,7 +211,9 @@ class PrivateAIScrubbingProvider(
             "X-API-KEY": config.PRIVATE_AI_API_KEY,
         }
 
-        response = requests.post(BASE64_URL, json=payload, headers=headers)
+        response = http_session.post(
+            BASE64_URL, data=orjson.dumps(payload), headers=headers
+        )
         response_data = response.json()
 
         # According to the PrivateAI API documentation,
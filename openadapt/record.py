@@ -441,6 +441,8 @@ def write_events(
                 progress.update()
         logger.debug(f"{event_type=} written")
 
+    crud.flush_insert_buffers(session)
+
     if post_callback:
         post_callback(state)
 
@@ -826,6 +828,7 @@ def performance_stats_writer(
             start_time,
             end_time,
         )
+    crud.flush_insert_buffers(session)
     logger.info("Performance stats writer done")
 
 
@@ -882,6 +885,7 @@ def memory_writer(
             rss,
             timestamp,
         )
+    crud.flush_insert_buffers(session)
     logger.info("Memory writer done")
 
 
@@ -1630,7 +1634,7 @@ def record(
 
     logger.info(f"Saved {recording_timestamp=}")
 
-    with crud.get_new_session(read_and_write=True) as session:
+    with crud.transactional_session() as session:
         crud.post_process_events(session, recording)
 
     if terminate_recording is not None:
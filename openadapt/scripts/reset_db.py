@@ -14,8 +14,11 @@ from openadapt.config import config
 
 def reset_db() -> None:
     """Clears the database by removing the db file and running a db migration."""
-    if os.path.exists(config.DATABASE_FILE_PATH):
-        os.remove(config.DATABASE_FILE_PATH)
+    # WAL mode keeps -wal and -shm files alongside the database file
+    for suffix in ("", "-wal", "-shm"):
+        file_path = f"{config.DATABASE_FILE_PATH}{suffix}"
+        if os.path.exists(file_path):
+            os.remove(file_path)
 
     # Prevents duplicate logging of config values by piping stderr
     #  and filtering the output.
@@ -5,15 +5,45 @@ Module: __init__.py
 
 # flake8: noqa
 
+from importlib import import_module
+from typing import Any
+
 from openadapt.strategies.base import BaseReplayStrategy
-from openadapt.strategies.visual_browser import VisualBrowserReplayStrategy
 
-# disabled because importing is expensive
-# from openadapt.strategies.demo import DemoReplayStrategy
-from openadapt.strategies.naive import NaiveReplayStrategy
-from openadapt.strategies.segment import SegmentReplayStrategy
-from openadapt.strategies.stateful import StatefulReplayStrategy
-from openadapt.strategies.vanilla import VanillaReplayStrategy
-from openadapt.strategies.visual import VisualReplayStrategy
+# strategies are imported on first access because importing them is expensive;
+# tests/openadapt/test_strategies.py checks that every strategy module is listed
+_MODULE_NAME_BY_STRATEGY_NAME = {
+    "VisualBrowserReplayStrategy": "visual_browser",
+    # disabled because importing is expensive
+    # "DemoReplayStrategy": "demo",
+    "NaiveReplayStrategy": "naive",
+    "SegmentReplayStrategy": "segment",
+    "StatefulReplayStrategy": "stateful",
+    "VanillaReplayStrategy": "vanilla",
+    "VisualReplayStrategy": "visual",
+    # add more strategies here
+}
+
+__all__ = ["BaseReplayStrategy", *_MODULE_NAME_BY_STRATEGY_NAME]
+
+
+def __getattr__(name: str) -> Any:
+    """Import the strategy with the given name on first access.
+
+    Args:
+        name (str): The name of the strategy class.
+
+    Returns:
+        The strategy class.
+    """
+    module_name = _MODULE_NAME_BY_STRATEGY_NAME.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = import_module(f"{__name__}.{module_name}")
+    return getattr(module, name)
+
 
-# add more strategies here
+def import_strategies() -> None:
+    """Import all strategies, registering them as BaseReplayStrategy subclasses."""
+    for name in _MODULE_NAME_BY_STRATEGY_NAME:
+        __getattr__(name)
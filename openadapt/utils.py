@@ -19,7 +19,7 @@ import time
 
 from bs4 import BeautifulSoup
 from jinja2 import Environment, FileSystemLoader
-from PIL import Image, ImageEnhance
+from PIL import Image, ImageStat
 from posthog import Posthog
 import multiprocessing_utils
 
@@ -374,11 +374,11 @@ def image2utf8(image: Image.Image, image_format: str = "JPEG") -> str:
     image = image.convert("RGB")
     buffered = BytesIO()
     image.save(buffered, format=image_format.upper())
-    image_str = base64.b64encode(buffered.getvalue())
+    # encode from a view of the buffer rather than a copy of it
+    with buffered.getbuffer() as image_bytes:
+        image_str = base64.b64encode(image_bytes).decode("ascii")
     fmt = image_format.lower()
-    base64_prefix = bytes(f"data:image/{fmt};base64,", encoding="utf-8")
-    image_base64 = base64_prefix + image_str
-    image_utf8 = image_base64.decode("utf-8")
+    image_utf8 = f"data:image/{fmt};base64,{image_str}"
     return image_utf8
 
 
@@ -481,8 +481,9 @@ def get_strategy_class_by_name() -> dict:
     Returns:
         dict: A dictionary of strategy classes.
     """
-    from openadapt.strategies import BaseReplayStrategy
+    from openadapt.strategies import BaseReplayStrategy, import_strategies
 
+    import_strategies()
     strategy_classes = BaseReplayStrategy.__subclasses__()
     class_by_name = {cls.__name__: cls for cls in strategy_classes}
     logger.debug(f"{class_by_name=}")
@@ -572,7 +573,8 @@ def get_action_dict_from_completion(completion: str) -> dict[ActionEvent]:
         dict: The action dictionary.
     """
     try:
-        action = eval(completion)
+        # completions should only contain literals, so don't execute anything else
+        action = ast.literal_eval(completion)
     except Exception as exc:
         logger.warning(f"{exc=}")
     else:
@@ -935,8 +937,20 @@ def increase_contrast(image: Image.Image, contrast_factor: float) -> Image.Image
     Returns:
         Image.Image: The contrast-enhanced image.
     """
-    enhancer = ImageEnhance.Contrast(image)
-    enhanced_image = enhancer.enhance(contrast_factor)
+    # equivalent to ImageEnhance.Contrast, but applied as a single lookup table
+    # instead of blending against a degenerate image filled with the mean
+    mean = int(ImageStat.Stat(image.convert("L")).mean[0] + 0.5)
+    band_lut = [
+        int(min(max(mean + contrast_factor * (value - mean), 0), 255))
+        for value in range(256)
+    ]
+    alpha_lut = list(range(256))
+    lut = [
+        value
+        for band in image.getbands()
+        for value in (alpha_lut if band == "A" else band_lut)
+    ]
+    enhanced_image = image.point(lut)
     return enhanced_image
 
 
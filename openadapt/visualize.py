@@ -1,5 +1,7 @@
 """Implements visualization utilities for OpenAdapt."""
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pprint import pformat
 from threading import Timer
 import html
@@ -9,6 +11,7 @@ import string
 from bokeh.io import output_file, show
 from bokeh.layouts import layout, row
 from bokeh.models.widgets import Div
+from PIL import Image
 
 from openadapt.build_utils import redirect_stdout_stderr
 from openadapt.custom_logger import logger
@@ -21,7 +24,7 @@ from openadapt import video
 from openadapt.config import RECORDING_DIR_PATH, config
 from openadapt.db import crud
 from openadapt.events import get_events
-from openadapt.models import Recording
+from openadapt.models import BrowserEvent, Recording, WindowEvent
 from openadapt.plotting import display_event
 from openadapt.utils import (
     EMPTY,
@@ -44,6 +47,31 @@ MAX_TABLE_CHILDREN = 5
 MAX_TABLE_STR_LEN = 1024
 PROCESS_EVENTS = True
 IMG_WIDTH_PCT = 60
+# each scrubbing worker loads its own spaCy model, so only a couple are started
+MAX_SCRUB_WORKERS = 2
+
+# scrubbing provider of a worker process, see init_scrub_worker
+worker_scrubber = None
+
+
+def init_scrub_worker() -> None:
+    """Create the scrubbing provider of a worker process."""
+    global worker_scrubber
+    from openadapt.privacy.providers.presidio import PresidioScrubbingProvider
+
+    worker_scrubber = PresidioScrubbingProvider()
+
+
+def scrub_image2utf8(image: Image.Image) -> str:
+    """Scrub an image with the worker's scrubbing provider and convert it to UTF-8.
+
+    Args:
+        image (PIL.Image.Image): The image to scrub.
+
+    Returns:
+        str: The UTF-8 encoded scrubbed image.
+    """
+    return image2utf8(worker_scrubber.scrub_image(image))
 
 
 def recursive_len(lst: list, key: str) -> int:
@@ -56,15 +84,20 @@ def recursive_len(lst: list, key: str) -> int:
     Returns:
         int: The recursive length of the list.
     """
-    try:
-        _len = len(lst)
-    except TypeError:
-        return 0
-    for obj in lst:
+    _len = 0
+    # walk nested lists with an explicit stack rather than recursing
+    to_visit = [lst]
+    while to_visit:
+        current = to_visit.pop()
         try:
-            _len += recursive_len(obj.get(key), key)
-        except AttributeError:
+            _len += len(current)
+        except TypeError:
             continue
+        for obj in current:
+            try:
+                to_visit.append(obj.get(key))
+            except AttributeError:
+                continue
     return _len
 
 
@@ -216,11 +249,16 @@ def main(
 
     meta = {}
     action_events = get_events(session, recording, process=PROCESS_EVENTS, meta=meta)
-    event_dicts = rows2dicts(action_events)
 
-    if SCRUB:
-        event_dicts = scrub.scrub_list_dicts(event_dicts)
-    logger.info(f"event_dicts=\n{pformat(event_dicts)}")
+    def format_event_dicts() -> str:
+        """Convert (and scrub) the action events for logging."""
+        event_dicts = rows2dicts(action_events)
+        if SCRUB:
+            event_dicts = scrub.scrub_list_dicts(event_dicts)
+        return pformat(event_dicts)
+
+    # only format the events if the message will be logged
+    logger.opt(lazy=True).info("event_dicts=\n{}", format_event_dicts)
 
     recording_dict = row2dict(recording)
     if SCRUB:
@@ -294,117 +332,196 @@ def main(
         ]
         frames = video.extract_frames(video_file_path, timestamps)
 
+    # many action events share a window or browser event, so convert (and scrub)
+    # each of those once
+    shared_event_dicts = {}
+
+    def get_shared_event_dict(event: WindowEvent | BrowserEvent | None) -> dict:
+        """Get the (scrubbed) dict of a window or browser event.
+
+        Args:
+            event (WindowEvent | BrowserEvent | None): The event.
+
+        Returns:
+            dict: The event converted to a dictionary.
+        """
+        key = (type(event), event.id if event else None)
+        if key not in shared_event_dicts:
+            event_dict = row2dict(event)
+            if SCRUB:
+                event_dict = scrub.scrub_dict(event_dict)
+            shared_event_dicts[key] = event_dict
+        return shared_event_dicts[key]
+
     num_events = (
         min(MAX_EVENTS, len(action_events))
         if MAX_EVENTS is not None
         else len(action_events)
     )
-    with redirect_stdout_stderr():
-        with tqdm(
-            total=num_events,
-            desc="Preparing HTML",
-            unit="event",
-            colour="green",
-            dynamic_ncols=True,
-        ) as progress:
-            for idx, action_event in enumerate(action_events):
-                if idx == MAX_EVENTS:
-                    break
-
-                try:
-                    image = display_event(action_event)
-                except TypeError as exc:
-                    # https://github.com/moses-palmer/pynput/issues/481
-                    logger.warning(exc)
-                    continue
-
-                if image:
-                    if diff_video:
-                        frame_image = frames[idx]
-                        diff_image = compute_diff(
-                            frame_image, action_event.screenshot.image
-                        )
+    # images are rendered in order, since that reads through the session, but
+    # encoded concurrently, since PIL's encoders and base64 release the GIL
+    num_workers = os.cpu_count() or 1
+    if SCRUB:
+        # scrubbing images is CPU-bound, so they are scrubbed (and encoded) in
+        # worker processes, each with its own scrubbing provider
+        num_workers = min(MAX_SCRUB_WORKERS, num_workers)
+        executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=init_scrub_worker,
+        )
+        encode_image = scrub_image2utf8
+    else:
+        executor = ThreadPoolExecutor(max_workers=num_workers)
+        encode_image = image2utf8
+
+    def append_event_row(prepared_event: tuple) -> None:
+        """Wait for the encoded images of a prepared event and append its row.
+
+        Args:
+            prepared_event (tuple): The image futures, image size, and event dicts.
+        """
+        (
+            image_utf8_futures,
+            width,
+            height,
+            action_event_dict,
+            window_event_dict,
+            browser_event_dict,
+        ) = prepared_event
+        if image_utf8_futures:
+            image_utf8, diff_utf8, mask_utf8 = [
+                future.result() for future in image_utf8_futures
+            ]
+        else:
+            image_utf8 = ""
+            diff_utf8 = ""
+            mask_utf8 = ""
+
+        rows.append(
+            [
+                row(
+                    Div(
+                        text=f"""
+                        <div class="screenshot">
+                            <img
+                                src="{image_utf8}"
+                                style="
+                                    aspect-ratio: {width}/{height};
+                                "
+                            >
+                            <img
+                                src="{diff_utf8}"
+                                style="
+                                    aspect-ratio: {width}/{height};
+                                "
+                            >
+                            <img
+                                src="{mask_utf8}"
+                                style="
+                                    aspect-ratio: {width}/{height};
+                                "
+                            >
+                        </div>
+                        <table>
+                            {dict2html(window_event_dict , None)}
+                        </table>
+                        <table>
+                            {dict2html(browser_event_dict , None)}
+                        </table>
+                    """,
+                    ),
+                    Div(
+                        text=f"""
+                        <table>
+                            {dict2html(action_event_dict)}
+                        </table>
+                    """
+                    ),
+                ),
+            ]
+        )
 
-                        # TODO: rename
-                        diff = frame_image
-                        mask = diff_image
+    # events whose images are being encoded; rows are appended in order once the
+    # window is full, so only a few events' images are held in memory at a time
+    max_prepared_events = 2 * num_workers
+    # shut down the workers even if preparing or rendering an event fails
+    with executor:
+        prepared_events = deque()
+        with redirect_stdout_stderr():
+            with tqdm(
+                total=num_events,
+                desc="Preparing HTML",
+                unit="event",
+                colour="green",
+                # only check for a redraw every 1% of events, then at most every 0.5s,
+                # at a fixed width rather than querying the terminal on each update
+                mininterval=0.5,
+                miniters=max(1, num_events // 100),
+                ncols=80,
+            ) as progress:
+                for idx, action_event in enumerate(action_events):
+                    if idx == MAX_EVENTS:
+                        break
+
+                    try:
+                        image = display_event(action_event)
+                    except TypeError as exc:
+                        # https://github.com/moses-palmer/pynput/issues/481
+                        logger.warning(exc)
+                        continue
+
+                    if image:
+                        if diff_video:
+                            frame_image = frames[idx]
+                            diff_image = compute_diff(
+                                frame_image, action_event.screenshot.image
+                            )
+
+                            # TODO: rename
+                            diff = frame_image
+                            mask = diff_image
+                        else:
+                            diff = display_event(action_event, diff=True)
+                            mask = action_event.screenshot.diff_mask
+
+                        image_utf8_futures = [
+                            executor.submit(encode_image, _image)
+                            for _image in (image, diff, mask)
+                        ]
+                        width, height = image.size
                     else:
-                        diff = display_event(action_event, diff=True)
-                        mask = action_event.screenshot.diff_mask
+                        # TODO: display a placeholder image
+                        image_utf8_futures = []
+                        width = 0
+                        height = 1
+
+                    action_event_dict = row2dict(action_event)
+                    window_event_dict = get_shared_event_dict(action_event.window_event)
+                    browser_event_dict = get_shared_event_dict(
+                        action_event.browser_event
+                    )
 
                     if SCRUB:
-                        image = scrub.scrub_image(image)
-                        diff = scrub.scrub_image(diff)
-                        mask = scrub.scrub_image(mask)
-
-                    image_utf8 = image2utf8(image)
-                    diff_utf8 = image2utf8(diff)
-                    mask_utf8 = image2utf8(mask)
-                    width, height = image.size
-                else:
-                    # TODO: display a placeholder image
-                    image_utf8 = ""
-                    diff_utf8 = ""
-                    mask_utf8 = ""
-                    width = 0
-                    height = 1
-
-                action_event_dict = row2dict(action_event)
-                window_event_dict = row2dict(action_event.window_event)
-                browser_event_dict = row2dict(action_event.browser_event)
-
-                if SCRUB:
-                    action_event_dict = scrub.scrub_dict(action_event_dict)
-                    window_event_dict = scrub.scrub_dict(window_event_dict)
-                    browser_event_dict = scrub.scrub_dict(browser_event_dict)
+                        action_event_dict = scrub.scrub_dict(action_event_dict)
+
+                    prepared_events.append(
+                        (
+                            image_utf8_futures,
+                            width,
+                            height,
+                            action_event_dict,
+                            window_event_dict,
+                            browser_event_dict,
+                        )
+                    )
 
-                rows.append(
-                    [
-                        row(
-                            Div(
-                                text=f"""
-                                <div class="screenshot">
-                                    <img
-                                        src="{image_utf8}"
-                                        style="
-                                            aspect-ratio: {width}/{height};
-                                        "
-                                    >
-                                    <img
-                                        src="{diff_utf8}"
-                                        style="
-                                            aspect-ratio: {width}/{height};
-                                        "
-                                    >
-                                    <img
-                                        src="{mask_utf8}"
-                                        style="
-                                            aspect-ratio: {width}/{height};
-                                        "
-                                    >
-                                </div>
-                                <table>
-                                    {dict2html(window_event_dict , None)}
-                                </table>
-                                <table>
-                                    {dict2html(browser_event_dict , None)}
-                                </table>
-                            """,
-                            ),
-                            Div(
-                                text=f"""
-                                <table>
-                                    {dict2html(action_event_dict)}
-                                </table>
-                            """
-                            ),
-                        ),
-                    ]
-                )
+                    if len(prepared_events) > max_prepared_events:
+                        append_event_row(prepared_events.popleft())
 
-                progress.update()
+                    progress.update()
 
-            progress.close()
+        while prepared_events:
+            append_event_row(prepared_events.popleft())
 
     # Visualize BrowserEvents
     rows.append([row(Div(text="<h2>Browser Events</h2>"))])
@@ -415,7 +532,9 @@ def main(
             desc="Preparing HTML (browser events)",
             unit="event",
             colour="green",
-            dynamic_ncols=True,
+            mininterval=0.5,
+            miniters=max(1, len(browser_events) // 100),
+            ncols=80,
         ) as progress:
             for idx, browser_event in enumerate(browser_events):
                 browser_event_dict = row2dict(browser_event)
@@ -435,8 +554,6 @@ def main(
 
                 progress.update()
 
-            progress.close()
-
     title = f"recording-{recording.id}"
 
     fname_out = RECORDING_DIR_PATH / f"recording-{recording.id}.html"
@@ -0,0 +1,86 @@
+"""Module to test scrubbing several texts at once."""
+
+from typing import List
+from unittest.mock import MagicMock, patch
+
+import orjson
+import pytest
+
+from openadapt.privacy.base import Modality, ScrubbingProvider
+from openadapt.privacy.providers import private_ai
+from openadapt.privacy.providers.private_ai import PrivateAIScrubbingProvider
+
+
+class UpperScrubbingProvider(ScrubbingProvider):
+    """A Scrubbing Provider that upper-cases texts."""
+
+    name: str = "UPPER"
+    capabilities: List[Modality] = [Modality.TEXT]
+
+    def scrub_text(self, text: str, is_separated: bool = False) -> str:
+        """Upper-case the text.
+
+        Args:
+            text (str): Text to be scrubbed
+            is_separated (bool): Whether the text is separated with special characters
+
+        Returns:
+            str: Upper-cased text
+        """
+        assert text, "None and empty texts should not be scrubbed"
+        return text.upper()
+
+
+def test_scrub_texts() -> None:
+    """Test that None and empty texts are passed through in their positions."""
+    scrubber = UpperScrubbingProvider()
+    assert scrubber.scrub_texts(["a", None, "", "b"]) == ["A", None, "", "B"]
+    assert scrubber.scrub_texts([None, ""]) == [None, ""]
+    assert scrubber.scrub_texts([]) == []
+
+
+def test_private_ai_scrub_texts() -> None:
+    """Test that only non-empty texts are sent, in a single request."""
+    response = MagicMock()
+    response.json.return_value = [
+        {"processed_text": "[NAME_GIVEN_1]"},
+        {"processed_text": "[NAME_FAMILY_1]"},
+    ]
+    scrubber = PrivateAIScrubbingProvider()
+    with patch.object(private_ai.http_session, "post", return_value=response) as post:
+        scrubbed_texts = scrubber.scrub_texts([None, "Bob", "", "Smith"])
+    assert scrubbed_texts == [None, "[NAME_GIVEN_1]", "", "[NAME_FAMILY_1]"]
+    post.assert_called_once()
+    assert orjson.loads(post.call_args.kwargs["data"])["text"] == ["Bob", "Smith"]
+
+
+def test_private_ai_scrub_texts_empty() -> None:
+    """Test that no request is sent when there is nothing to scrub."""
+    scrubber = PrivateAIScrubbingProvider()
+    with patch.object(private_ai.http_session, "post") as post:
+        assert scrubber.scrub_texts([None, ""]) == [None, ""]
+        assert scrubber.scrub_text(None) is None
+    post.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        # fewer results than texts sent
+        [{"processed_text": "[NAME_GIVEN_1]"}],
+        # a result without processed text
+        [{"processed_text": "[NAME_GIVEN_1]"}, {}],
+    ],
+)
+def test_private_ai_scrub_texts_malformed_response(data: list[dict]) -> None:
+    """Test that a malformed response raises instead of returning unscrubbed text.
+
+    Args:
+        data (list[dict]): The response data.
+    """
+    response = MagicMock()
+    response.json.return_value = data
+    scrubber = PrivateAIScrubbingProvider()
+    with patch.object(private_ai.http_session, "post", return_value=response):
+        with pytest.raises((ValueError, KeyError)):
+            scrubber.scrub_texts(["Bob", "Smith"])
@@ -1,12 +1,66 @@
 """Tests for the CRUD operations in the openadapt.db.crud module."""
 
-from unittest.mock import patch
+from collections import defaultdict
+from unittest.mock import MagicMock, patch
+import io
 
+from PIL import Image
 import pytest
 import sqlalchemy as sa
 
 from openadapt.db import crud, db
-from openadapt.models import Recording
+from openadapt.models import (
+    ActionEvent,
+    BrowserEvent,
+    PerformanceStat,
+    Recording,
+    Screenshot,
+    WindowEvent,
+)
+
+
+def create_recording(session: sa.orm.Session) -> Recording:
+    """Create and commit a recording.
+
+    Args:
+        session (sa.orm.Session): The database session.
+
+    Returns:
+        Recording: The committed recording.
+    """
+    recording = Recording(
+        timestamp=0,
+        monitor_width=1920,
+        monitor_height=1080,
+        double_click_interval_seconds=0,
+        double_click_distance_pixels=0,
+        platform="Windows",
+        task_description="Task description",
+    )
+    session.add(recording)
+    session.commit()
+    return recording
+
+
+def create_screenshots(session: sa.orm.Session, recording: Recording) -> None:
+    """Create and commit screenshots of different colors for a recording.
+
+    Args:
+        session (sa.orm.Session): The database session.
+        recording (Recording): The recording the screenshots belong to.
+    """
+    for i, color in enumerate(("red", "green", "blue")):
+        buffer = io.BytesIO()
+        Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+        session.add(
+            Screenshot(
+                recording=recording,
+                recording_timestamp=recording.timestamp,
+                timestamp=i,
+                png_data=buffer.getvalue(),
+            )
+        )
+    session.commit()
 
 
 def test_get_new_session_read_only(db_engine: sa.engine.Engine) -> None:
@@ -38,3 +92,554 @@ def test_get_new_session_read_only(db_engine: sa.engine.Engine) -> None:
             session.flush()
         with pytest.raises(PermissionError):
             session.delete(recording)
+
+
+def test_get_screenshots_save_diff(db_engine: sa.engine.Engine) -> None:
+    """Test that get_screenshots stores the diff data when save_diff=True.
+
+    Args:
+        db_engine (sa.engine.Engine): The test database engine.
+    """
+    session = sa.orm.sessionmaker(bind=db_engine)()
+    recording = create_recording(session)
+    create_screenshots(session, recording)
+
+    screenshots = crud.get_screenshots(session, recording, save_diff=True)
+    recording_id = recording.id
+    session.close()
+
+    session = sa.orm.sessionmaker(bind=db_engine)()
+    recording = session.get(Recording, recording_id)
+    stored_screenshots = crud.get_screenshots(session, recording)
+    assert len(stored_screenshots) == len(screenshots) == 3
+    for screenshot in stored_screenshots:
+        png_diff_data, png_diff_mask_data = crud.compute_png_diff(
+            screenshot.prev.png_data, screenshot.png_data
+        )
+        assert screenshot.png_diff_data == png_diff_data
+        assert screenshot.png_diff_mask_data == png_diff_mask_data
+    session.close()
+
+
+def test_save_screenshot_diff_daemon(db_engine: sa.engine.Engine) -> None:
+    """Test that save_screenshot_diff runs serially in a daemonic process.
+
+    Args:
+        db_engine (sa.engine.Engine): The test database engine.
+    """
+    session = sa.orm.sessionmaker(bind=db_engine)()
+    recording = create_recording(session)
+    create_screenshots(session, recording)
+    screenshots = crud.get_screenshots(session, recording)
+
+    with (
+        patch("multiprocessing.current_process", return_value=MagicMock(daemon=True)),
+        patch("openadapt.db.crud.ProcessPoolExecutor") as executor,
+    ):
+        crud.save_screenshot_diff(session, screenshots, num_workers=2, chunk_size=1)
+    executor.assert_not_called()
+    assert all(screenshot.png_diff_data for screenshot in screenshots)
+    assert all(screenshot.png_diff_mask_data for screenshot in screenshots)
+    session.close()
+
+
+@pytest.mark.parametrize(
+    "chunk_size, pooled",
+    [
+        # only 3 screenshots, too few to start the pool for
+        (2, False),
+        (1, True),
+    ],
+)
+def test_save_screenshot_diff_pool(
+    db_engine: sa.engine.Engine, chunk_size: int, pooled: bool
+) -> None:
+    """Test that save_screenshot_diff only starts a pool for enough screenshots.
+
+    Args:
+        db_engine (sa.engine.Engine): The test database engine.
+        chunk_size (int): The number of screenshots per task.
+        pooled (bool): Whether the diffs are expected to be computed in a pool.
+    """
+    session = sa.orm.sessionmaker(bind=db_engine)()
+    recording = create_recording(session)
+    create_screenshots(session, recording)
+    screenshots = crud.get_screenshots(session, recording)
+
+    with patch(
+        "openadapt.db.crud.ProcessPoolExecutor", wraps=crud.ProcessPoolExecutor
+    ) as executor:
+        crud.save_screenshot_diff(
+            session, screenshots, num_workers=2, chunk_size=chunk_size
+        )
+    assert executor.called == pooled
+    for screenshot in screenshots:
+        png_diff_data, png_diff_mask_data = crud.compute_png_diff(
+            screenshot.prev.png_data, screenshot.png_data
+        )
+        assert screenshot.png_diff_data == png_diff_data
+        assert screenshot.png_diff_mask_data == png_diff_mask_data
+    session.close()
+
+
+def count_rows(session: sa.orm.Session, table: sa.Table, recording: Recording) -> int:
+    """Count the rows of a table belonging to a recording.
+
+    Args:
+        session (sa.orm.Session): The database session.
+        table (sa.Table): The SQLAlchemy table.
+        recording (Recording): The recording the rows belong to.
+
+    Returns:
+        int: The number of rows.
+    """
+    return session.scalar(
+        sa.select(sa.func.count())
+        .select_from(table)
+        .where(table.recording_id == recording.id)
+    )
+
+
+def test_insert_buffers(db_engine: sa.engine.Engine) -> None:
+    """Test that inserted rows are buffered per table until full or flushed.
+
+    Args:
+        db_engine (sa.engine.Engine): The test database engine.
+    """
+    session = sa.orm.sessionmaker(bind=db_engine)()
+    recording = create_recording(session)
+
+    with (
+        patch.object(crud, "BATCH_SIZE", 3),
+        patch.object(crud, "insert_buffers", defaultdict(list)),
+    ):
+        # below the batch size, nothing is written
+        for timestamp in range(2):
+            crud.insert_window_event(session, recording, timestamp, {"title": "a"})
+        crud.insert_perf_stat(session, recording, "window", 0, 1)
+        assert count_rows(session, WindowEvent, recording) == 0
+        assert count_rows(session, PerformanceStat, recording) == 0
+
+        # a full buffer writes only its own table
+        crud.insert_window_event(session, recording, 2, {"title": "a"})
+        assert count_rows(session, WindowEvent, recording) == 3
+        assert count_rows(session, PerformanceStat, recording) == 0
+        assert not crud.insert_buffers[WindowEvent]
+        assert len(crud.insert_buffers[PerformanceStat]) == 1
+
+        # flushing writes the remaining rows of every table
+        crud.insert_window_event(session, recording, 3, {"title": "a"})
+        crud.flush_insert_buffers(session)
+        assert count_rows(session, WindowEvent, recording) == 4
+        assert count_rows(session, PerformanceStat, recording) == 1
+        assert not any(crud.insert_buffers.values())
+    session.close()
+
+
+def create_events(session: sa.orm.Session, recording: Recording) -> None:
+    """Create and commit action events referencing other events by timestamp.
+
+    Args:
+        session (sa.orm.Session): The database session.
+        recording (Recording): The recording the events belong to.
+    """
+    with patch.object(crud, "insert_buffers", defaultdict(list)):
+        for timestamp in (0, 1):
+            crud.insert_screenshot(session, recording, timestamp, {})
+            crud.insert_window_event(session, recording, timestamp, {"title": "a"})
+            crud.insert_browser_event(session, recording, timestamp, {"message": {}})
+        for timestamp in (0, 1, 2):
+            crud.insert_action_event(
+                session,
+                recording,
+                timestamp,
+                {
+                    "name": "click",
+                    "screenshot_timestamp": timestamp,
+                    "window_event_timestamp": timestamp,
+                    "browser_event_timestamp": timestamp,
+                },
+            )
+        crud.flush_insert_buffers(session)
+
+
+def get_linked_ids(
+    session: sa.orm.Session, recording: Recording
+) -> list[tuple[int | None, int | None, int | None]]:
+    """Get the linked event ids of each action event, ordered by timestamp.
+
+    Args:
+        session (sa.orm.Session): The database session.
+        recording (Recording): The recording the events belong to.
+
+    Returns:
+        list[tuple]: The screenshot, window event, and browser event ids.
+    """
+    return [
+        tuple(row)
+        for row in session.execute(
+            sa.select(
+                ActionEvent.screenshot_id,
+                ActionEvent.window_event_id,
+                ActionEvent.browser_event_id,
+            )
+            .where(ActionEvent.recording_id == recording.id)
+            .order_by(ActionEvent.timestamp)
+        )
+    ]
+
+
+def get_ids_by_timestamp(
+    session: sa.orm.Session, table: sa.Table, recording: Recording
+) -> dict[float, int]:
+    """Get the ids of the rows of a table belonging to a recording by timestamp.
+
+    Args:
+        session (sa.orm.Session): The database session.
+        table (sa.Table): The SQLAlchemy table.
+        recording (Recording): The recording the rows belong to.
+
+    Returns:
+        dict[float, int]: The row ids by timestamp.
+    """
+    return dict(
+        session.execute(
+            sa.select(table.timestamp, table.id).where(
+                table.recording_id == recording.id
+            )
+        ).all()
+    )
+
+
+def test_post_process_events(db_engine: sa.engine.Engine) -> None:
+    """Test that post_process_events links action events to events by timestamp.
+
+    Args:
+        db_engine (sa.engine.Engine): The test database engine.
+    """
+    # keep the recording loaded after its session is closed
+    session_maker = sa.orm.sessionmaker(bind=db_engine, expire_on_commit=False)
+    session = session_maker()
+    recording = create_recording(session)
+    create_events(session, recording)
+    session.close()
+
+    with patch.object(crud, "Session", session_maker):
+        with crud.transactional_session() as session:
+            crud.post_process_events(session, recording)
+
+    session = session_maker()
+    screenshot_ids = get_ids_by_timestamp(session, Screenshot, recording)
+    window_event_ids = get_ids_by_timestamp(session, WindowEvent, recording)
+    browser_event_ids = get_ids_by_timestamp(session, BrowserEvent, recording)
+    assert get_linked_ids(session, recording) == [
+        (screenshot_ids[0], window_event_ids[0], browser_event_ids[0]),
+        (screenshot_ids[1], window_event_ids[1], browser_event_ids[1]),
+        # no events share the timestamp of the last action event
+        (None, None, None),
+    ]
+    session.close()
+
+
+def test_post_process_events_rollback(db_engine: sa.engine.Engine) -> None:
+    """Test that post_process_events is rolled back if the transaction fails.
+
+    Args:
+        db_engine (sa.engine.Engine): The test database engine.
+    """
+    # keep the recording loaded after its session is closed
+    session_maker = sa.orm.sessionmaker(bind=db_engine, expire_on_commit=False)
+    session = session_maker()
+    recording = create_recording(session)
+    create_events(session, recording)
+    session.close()
+
+    with patch.object(crud, "Session", session_maker):
+        with pytest.raises(RuntimeError):
+            with crud.transactional_session() as session:
+                crud.post_process_events(session, recording)
+                raise RuntimeError()
+
+    session = session_maker()
+    assert get_linked_ids(session, recording) == [(None, None, None)] * 3
+    session.close()
+
+
+def create_action_event_trees(session: sa.orm.Session, recording: Recording) -> None:
+    """Create and commit nested action events sharing a screenshot and window event.
+
+    Args:
+        session (sa.orm.Session): The database session.
+        recording (Recording): The recording the events belong to.
+    """
+    screenshot = Screenshot(
+        recording=recording, recording_timestamp=recording.timestamp, timestamp=0
+    )
+    window_event = WindowEvent(
+        recording=recording,
+        recording_timestamp=recording.timestamp,
+        timestamp=0,
+        title="a",
+    )
+
+    def create_action_event(
+        timestamp: float, children: list[ActionEvent] = ()
+    ) -> ActionEvent:
+        """Create an action event.
+
+        Args:
+            timestamp (float): The timestamp of the event.
+            children (list[ActionEvent]): The children of the event.
+
+        Returns:
+            ActionEvent: The action event.
+        """
+        return ActionEvent(
+            name="click",
+            recording=recording,
+            recording_timestamp=recording.timestamp,
+            timestamp=timestamp,
+            children=list(children),
+        )
+
+    action_events = [
+        create_action_event(
+            0,
+            [
+                create_action_event(1),
+                create_action_event(2, [create_action_event(3)]),
+            ],
+        ),
+        create_action_event(4),
+    ]
+    for action_event in action_events:
+        action_event.screenshot = screenshot
+        action_event.window_event = window_event
+    session.add_all(action_events)
+    session.commit()
+
+
+def get_action_event_tree(action_event: ActionEvent) -> tuple:
+    """Get the timestamps of an action event and its descendants.
+
+    Args:
+        action_event (ActionEvent): The action event.
+
+    Returns:
+        tuple: The timestamp and the trees of the children, ordered by timestamp.
+    """
+    return (
+        action_event.timestamp,
+        sorted(get_action_event_tree(child) for child in action_event.children),
+    )
+
+
+def copy_recording(
+    db_engine: sa.engine.Engine, session: sa.orm.Session, recording: Recording
+) -> int | None:
+    """Copy a recording, reading top-level action events in place of get_events.
+
+    Args:
+        db_engine (sa.engine.Engine): The test database engine.
+        session (sa.orm.Session): The database session.
+        recording (Recording): The recording to copy.
+
+    Returns:
+        int | None: The id of the copy, or None if copying failed.
+    """
+    events = MagicMock()
+    events.get_events.side_effect = lambda session, recording: crud.get_action_events(
+        session, recording, top_level_only=True
+    )
+    with (
+        patch(
+            "openadapt.db.crud.get_read_only_session_maker",
+            return_value=db.get_read_only_session_maker(db_engine),
+        ),
+        # processing the events is out of scope
+        patch.dict("sys.modules", {"openadapt.events": events}),
+    ):
+        return crud.copy_recording(session, recording.id)
+
+
+def test_copy_recording(db_engine: sa.engine.Engine) -> None:
+    """Test that copying a recording keeps nested and shared events.
+
+    Args:
+        db_engine (sa.engine.Engine): The test database engine.
+    """
+    # keep the recording loaded after its session is closed
+    session_maker = sa.orm.sessionmaker(bind=db_engine, expire_on_commit=False)
+    session = session_maker()
+    recording = create_recording(session)
+    create_action_event_trees(session, recording)
+
+    new_recording_id = copy_recording(db_engine, session, recording)
+    session.close()
+
+    session = session_maker()
+    recording = session.get(Recording, recording.id)
+    new_recording = session.get(Recording, new_recording_id)
+    assert new_recording.original_recording_id == recording.id
+    assert new_recording.task_description == recording.task_description
+
+    action_events = crud.get_action_events(session, recording, top_level_only=True)
+    new_action_events = crud.get_action_events(
+        session, new_recording, top_level_only=True
+    )
+    assert [get_action_event_tree(event) for event in new_action_events] == [
+        get_action_event_tree(event) for event in action_events
+    ]
+    assert count_rows(session, ActionEvent, new_recording) == 5
+    assert all(
+        child.recording_id == new_recording.id
+        for child in new_action_events[0].children
+    )
+
+    # the shared screenshot and window event are each copied once
+    assert count_rows(session, Screenshot, new_recording) == 1
+    assert count_rows(session, WindowEvent, new_recording) == 1
+    assert len({event.screenshot_id for event in new_action_events}) == 1
+    assert len({event.window_event_id for event in new_action_events}) == 1
+    assert new_action_events[0].screenshot.recording_id == new_recording.id
+    assert new_action_events[0].window_event.recording_id == new_recording.id
+    session.close()
+
+
+def test_copy_recording_rollback(db_engine: sa.engine.Engine) -> None:
+    """Test that nothing is copied if copying a recording fails partway.
+
+    Args:
+        db_engine (sa.engine.Engine): The test database engine.
+    """
+    # keep the recording loaded after its session is closed
+    session_maker = sa.orm.sessionmaker(bind=db_engine, expire_on_commit=False)
+    session = session_maker()
+    recording = create_recording(session)
+    create_action_event_trees(session, recording)
+    # the failed copy rolls back the session, expiring the recording
+    recording_id = recording.id
+    recording_count = session.scalar(sa.select(sa.func.count(Recording.id)))
+    action_event_count = session.scalar(sa.select(sa.func.count(ActionEvent.id)))
+
+    copy_sa_instance = crud.copy_sa_instance
+    num_copies = 0
+
+    def fail_on_window_event(sa_instance: db.Base, **kwargs: dict) -> db.Base:
+        """Copy the instance, failing once the action events have been copied.
+
+        Args:
+            sa_instance (Base): The SQLAlchemy instance to copy.
+            **kwargs: Additional keyword arguments to pass to the copied instance.
+
+        Returns:
+            Base: The copied SQLAlchemy instance.
+        """
+        nonlocal num_copies
+        num_copies += 1
+        if isinstance(sa_instance, WindowEvent):
+            raise RuntimeError()
+        return copy_sa_instance(sa_instance, **kwargs)
+
+    with patch.object(crud, "copy_sa_instance", side_effect=fail_on_window_event):
+        assert copy_recording(db_engine, session, recording) is None
+    # the recording and action events were copied before failing
+    assert num_copies > 6
+    session.close()
+
+    session = session_maker()
+    assert session.scalar(sa.select(sa.func.count(Recording.id))) == recording_count
+    assert (
+        session.scalar(sa.select(sa.func.count(ActionEvent.id))) == action_event_count
+    )
+    assert not session.scalars(
+        sa.select(Recording).where(Recording.original_recording_id == recording_id)
+    ).all()
+    session.close()
+
+
+def test_get_action_events_top_level_only(db_engine: sa.engine.Engine) -> None:
+    """Test that get_action_events only leaves out children with top_level_only.
+
+    Args:
+        db_engine (sa.engine.Engine): The test database engine.
+    """
+    session = sa.orm.sessionmaker(bind=db_engine)()
+    recording = create_recording(session)
+    create_action_event_trees(session, recording)
+
+    action_events = crud.get_action_events(session, recording)
+    assert [event.timestamp for event in action_events] == [0, 1, 2, 3, 4]
+
+    top_level_action_events = crud.get_action_events(
+        session, recording, top_level_only=True
+    )
+    assert [event.timestamp for event in top_level_action_events] == [0, 4]
+    assert all(event.parent_id is None for event in top_level_action_events)
+    # children are still reachable through their parents
+    assert get_action_event_tree(top_level_action_events[0]) == (
+        0,
+        [(1, []), (2, [(3, [])])],
+    )
+    session.close()
+
+
+def test_screenshot_png_deferred(db_engine: sa.engine.Engine) -> None:
+    """Test that PNG data is deferred, except where it is loaded for use later.
+
+    Args:
+        db_engine (sa.engine.Engine): The test database engine.
+    """
+    png_column_names = {"png_data", "png_diff_data", "png_diff_mask_data"}
+    session_maker = sa.orm.sessionmaker(bind=db_engine, expire_on_commit=False)
+    session = session_maker()
+    recording = create_recording(session)
+    create_screenshots(session, recording)
+    for screenshot in session.scalars(
+        sa.select(Screenshot).where(Screenshot.recording_id == recording.id)
+    ):
+        session.add(
+            ActionEvent(
+                name="click",
+                recording=recording,
+                recording_timestamp=recording.timestamp,
+                timestamp=screenshot.timestamp,
+                screenshot=screenshot,
+            )
+        )
+    session.commit()
+    session.close()
+
+    # ordinary queries do not load the PNG data
+    session = session_maker()
+    screenshots = session.scalars(
+        sa.select(Screenshot).where(Screenshot.recording_id == recording.id)
+    ).all()
+    assert all(
+        png_column_names <= sa.inspect(screenshot).unloaded
+        for screenshot in screenshots
+    )
+    session.close()
+
+    # the PNG data of screenshots and of action events' screenshots is loaded, so
+    # images can be read after the session is closed, e.g. by display_event
+    # (in separate sessions, so neither reuses the instances loaded by the other)
+    session = session_maker()
+    screenshots = crud.get_screenshots(session, recording)
+    session.close()
+    session = session_maker()
+    action_events = crud.get_action_events(session, recording)
+    session.close()
+    action_event_screenshots = [event.screenshot for event in action_events]
+    for prev, screenshot in zip(
+        [action_event_screenshots[0], *action_event_screenshots],
+        action_event_screenshots,
+    ):
+        screenshot.prev = prev
+    for screenshot in [*screenshots, *action_event_screenshots]:
+        assert not png_column_names & sa.inspect(screenshot).unloaded
+        assert screenshot.image.size == (8, 8)
+        assert screenshot.diff.size == (8, 8)
+        assert screenshot.diff_mask.size == (8, 8)
+    assert screenshots[1].diff.getpixel((0, 0)) == (255, 128, 0)
+    assert action_event_screenshots[1].diff.getpixel((0, 0)) == (255, 128, 0)
@@ -0,0 +1,54 @@
+"""Tests for the lazily imported strategies in the openadapt.strategies package."""
+
+from importlib import import_module
+import inspect
+import pkgutil
+
+import pytest
+
+from openadapt import strategies, utils
+from openadapt.strategies import BaseReplayStrategy
+
+# strategy modules whose import is disabled in openadapt.strategies
+DISABLED_MODULE_NAMES = {"demo"}
+
+
+def get_strategy_module_names() -> list[str]:
+    """Get the names of the strategy modules in the openadapt.strategies package.
+
+    Returns:
+        list[str]: The module names, excluding packages (e.g. mixins).
+    """
+    return [
+        module_info.name
+        for module_info in pkgutil.iter_modules(strategies.__path__)
+        if not module_info.ispkg
+        and module_info.name not in {"base", *DISABLED_MODULE_NAMES}
+    ]
+
+
+def test_import_strategies() -> None:
+    """Test that every strategy module's strategy is available by name."""
+    class_by_name = utils.get_strategy_class_by_name()
+    module_names = get_strategy_module_names()
+    assert module_names
+
+    for module_name in module_names:
+        module = import_module(f"{strategies.__name__}.{module_name}")
+        strategy_classes = [
+            cls
+            for _, cls in inspect.getmembers(module, inspect.isclass)
+            if cls.__module__ == module.__name__ and BaseReplayStrategy in cls.__bases__
+        ]
+        assert strategy_classes, module_name
+        for cls in strategy_classes:
+            assert class_by_name[cls.__name__] is cls
+            assert getattr(strategies, cls.__name__) is cls
+            assert cls.__name__ in strategies.__all__
+
+
+def test_unknown_strategy() -> None:
+    """Test that accessing an unknown strategy raises AttributeError."""
+    with pytest.raises(AttributeError):
+        strategies.UnknownReplayStrategy
+    assert not hasattr(strategies, "UnknownReplayStrategy")